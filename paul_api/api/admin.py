@@ -106,6 +106,12 @@ class EntryAdmin(admin.ModelAdmin):
     # form = EntryAdminForm
     list_filter = ("table__name",)
     search_fields = ['data']
+
+    def delete_queryset(self, request, queryset):
+        tables = list(models.Table.objects.filter(pk__in=queryset.values("table_id")))
+        super().delete_queryset(request, queryset)
+        for table in tables:
+            table.refresh_entries_count()
     # def get_form(self, request, obj=None, **kwargs):
     #     # By passing 'fields', we prevent ModelAdmin.get_form from
     #     # looking up the fields itself by calling self.get_fieldsets()
@@ -70,6 +70,7 @@ class Command(BaseCommand):
             print(table.fields.all().delete())
             print("Deleting all entries from table", table)
             print(table.entries.all().delete())
+            table.refresh_entries_count()
         print("Delete all attributes", Attribute.objects.all().delete())
         for table_name, fields in tables_map.items():
             table = models.Table.objects.get(name=table_name)
@@ -138,6 +139,8 @@ class Command(BaseCommand):
                 )
             )
         models.Entry.objects.bulk_create(entries)
+        for table in (utilizatori, abonamente, evenimente):
+            table.refresh_entries_count()
 
 
 # fake.text()
@@ -85,6 +85,7 @@ class Command(BaseCommand):
             print(table.fields.all().delete())
             print("Deleting all entries from table", table)
             print(table.entries.all().delete())
+            table.refresh_entries_count()
         for table_name, fields in tables_map.items():
             table = models.Table.objects.get(name=table_name)
             table.active = True
@@ -179,6 +180,8 @@ class Command(BaseCommand):
         print("Saving batch {}".format(i / 10000))
         models.Entry.objects.bulk_create(entries)
         print("Batch {} saved".format(i / 10000))
+        for table in (utilizatori, abonamente, evenimente):
+            table.refresh_entries_count()
 
 
 # fake.text()
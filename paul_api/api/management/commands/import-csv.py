@@ -26,6 +26,7 @@ class Command(BaseCommand):
             print(table.fields.all().delete())
             print("Deleting all entries from table", table)
             print(table.entries.all().delete())
+            table.refresh_entries_count()
 
             for field_name in csvfile.fieldnames:
                 column = models.TableColumn.objects.get_or_create(
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.14 on 2026-10-14 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0050_auto_20220730_1410'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='table',
+            index=models.Index(fields=['database', 'active'], name='api_table_database_active'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.14 on 2026-10-14 19:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def forwards_func(apps, schema_editor):
+    # We get the model from the versioned app registry;
+    # if we directly import it, it'll be the wrong version
+    Table = apps.get_model("api", "Table")
+    Entry = apps.get_model("api", "Entry")
+    counts = (
+        Entry.objects.filter(table=OuterRef("pk"))
+        .order_by()
+        .values("table")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Table.objects.update(entries_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0051_table_api_table_database_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='table',
+            name='entries_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
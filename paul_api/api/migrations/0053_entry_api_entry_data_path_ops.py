@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-14 19:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0052_table_entries_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['data'], name='api_entry_data_path_ops', opclasses=['jsonb_path_ops']),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.14 on 2026-10-14 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0053_entry_api_entry_data_path_ops'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['table', 'id'], name='api_entry_table_id'),
+        ),
+    ]
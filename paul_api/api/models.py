@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import DatabaseError, models
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
 from django.utils.text import slugify
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import Group
@@ -10,6 +14,7 @@ from django.dispatch import receiver
 from djoser.signals import user_activated
 from api import utils
 
+from functools import lru_cache
 import uuid
 import re
 
@@ -35,6 +40,24 @@ def user_activated_callback(sender, **kwargs):
             to=admin.email)
 
 
+@lru_cache(maxsize=1)
+def get_admin_group():
+    """
+    The admin group, looked up once per process. None until the group exists
+    """
+    return Group.objects.filter(name="admin").first()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def clear_admin_group(sender, **kwargs):
+    get_admin_group.cache_clear()
+
+
+def is_admin(user):
+    admin_group = get_admin_group()
+    return admin_group is not None and user.groups.filter(pk=admin_group.pk).exists()
+
+
 datatypes = (
     ("text", "text"),
     ("int", "int"),
@@ -113,7 +136,38 @@ class UserCard(models.Model):
             self.card,
             self.order)
 
-class Database(models.Model):
+class SlugFromNameMixin:
+    """
+    Remembers the name loaded from the database so save() only rebuilds the slug when it changes
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_name = instance.__dict__.get("name")
+        return instance
+
+    def name_changed(self):
+        return self._state.adding or getattr(self, "_loaded_name", None) != self.name
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "name" in update_fields:
+            self._loaded_name = self.name
+
+    @classmethod
+    def bulk_create_with_slugs(cls, objs, batch_size=500):
+        """
+        Inserts the objects in batches; bulk_create() skips save(), so the slugs are set here first
+        """
+        for obj in objs:
+            value = re.sub('_+', '_', obj.name)
+            obj.slug = slugify(value, allow_unicode=True)
+        return cls.objects.bulk_create(objs, batch_size=batch_size)
+
+
+class Database(SlugFromNameMixin, models.Model):
     """
     Description: Model Description
     """
@@ -128,21 +182,42 @@ class Database(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        value = self.name
-        self.slug = slugify(value, allow_unicode=True)
+        if self.name_changed():
+            value = self.name
+            self.slug = slugify(value, allow_unicode=True)
         super().save(*args, **kwargs)
 
+    def prefetched_tables(self):
+        return getattr(self, "_prefetched_objects_cache", {}).get("tables")
+
     def active_tables(self):
-        return self.tables.filter(active=True).order_by("id")
+        tables = self.prefetched_tables()
+        if tables is not None:
+            return [table for table in tables if table.active]
+        return (
+            self.tables.filter(active=True)
+            .select_related("owner", "last_edit_user")
+            .order_by("id")
+        )
 
     def archived_tables(self):
-        return self.tables.filter(active=False).order_by("id")
+        tables = self.prefetched_tables()
+        if tables is not None:
+            return [table for table in tables if not table.active]
+        return (
+            self.tables.filter(active=False)
+            .select_related("owner", "last_edit_user")
+            .order_by("id")
+        )
 
     def tables_count(self):
+        tables = self.prefetched_tables()
+        if tables is not None:
+            return len(tables)
         return self.tables.count()
 
 
-class Table(models.Model):
+class Table(SlugFromNameMixin, models.Model):
     """
     Description: Model Description
     """
@@ -169,6 +244,8 @@ class Table(models.Model):
 
     filters = models.JSONField(
         encoder=DjangoJSONEncoder, null=True, blank=True)
+    # Kept up to date by Entry.save()'s signal and Entry.delete(), see refresh_entries_count() for bulk changes
+    entries_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         permissions = (
@@ -177,21 +254,53 @@ class Table(models.Model):
             ("delete", "View"),
         )
         unique_together = ["name", "database"]
+        indexes = [
+            models.Index(fields=["database", "active"], name="api_table_database_active"),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        value = re.sub('_+', '_', self.name)
-        self.slug = slugify(value, allow_unicode=True)
-        self.last_edit_date = timezone.now()
-        super().save(*args, **kwargs)
-
-    def entries_count(self):
-        return self.entries.count()
-
-
-class TableColumn(models.Model):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            # A rename also refreshes the slug and counts as an edit
+            update_fields = kwargs["update_fields"] = set(update_fields) | {"slug", "last_edit_date"}
+        # Never write back a possibly stale entries_count, it is maintained in the database.
+        # Only when the caller gives no update_fields, and leaving out the deferred fields like save() does
+        entries_count_skipped = update_fields is None and not self._state.adding and not kwargs.get("force_insert")
+        if entries_count_skipped:
+            deferred_fields = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "entries_count" and field.attname not in deferred_fields
+            ]
+
+        if update_fields is None or "slug" in update_fields:
+            if self.name_changed():
+                value = re.sub('_+', '_', self.name)
+                self.slug = slugify(value, allow_unicode=True)
+        if update_fields is None or "last_edit_date" in update_fields:
+            self.last_edit_date = timezone.now()
+        try:
+            super().save(*args, **kwargs)
+        except DatabaseError as e:
+            if not entries_count_skipped or str(e) != "Save with update_fields did not affect any rows.":
+                raise
+            # The row was deleted: like a save without update_fields, insert it again
+            del kwargs["update_fields"]
+            super().save(*args, **kwargs)
+
+    def refresh_entries_count(self):
+        """
+        Recounts the entries, for changes that skip Entry.save() and Entry.delete() (bulk_create, queryset delete)
+        """
+        self.entries_count = self.entries.count()
+        Table.objects.filter(pk=self.pk).update(entries_count=self.entries_count)
+
+
+class TableColumn(SlugFromNameMixin, models.Model):
     """
     Description: Model Description
     """
@@ -216,8 +325,9 @@ class TableColumn(models.Model):
         return "[{}] {} ({})".format(self.table, self.name, self.field_type)
 
     def save(self, *args, **kwargs):
-        value = re.sub('_+', '_', self.name)
-        self.slug = slugify(value, allow_unicode=True)
+        if self.name_changed():
+            value = re.sub('_+', '_', self.name)
+            self.slug = slugify(value, allow_unicode=True)
         super().save(*args, **kwargs)
 
 
@@ -293,14 +403,33 @@ class Entry(models.Model):
 
     class Meta:
         verbose_name_plural = "Entries"
+        indexes = [
+            # Serves the data__contains lookups of the unique field checks and the CSV import
+            GinIndex(fields=["data"], opclasses=["jsonb_path_ops"], name="api_entry_data_path_ops"),
+            # Serves the default ordering of the entries of a table, without sorting them in memory
+            models.Index(fields=["table", "id"], name="api_entry_table_id"),
+        ]
 
     def __str__(self):
         return self.table.name
 
+    def delete(self, *args, **kwargs):
+        # Not a post_delete receiver: any receiver would turn off the fast (single query) cascade deletes
+        # of the entries of a deleted table. Bulk deletes call Table.refresh_entries_count() instead
+        result = super().delete(*args, **kwargs)
+        # Clamped, so a drifted count of 0 doesn't fail the positive integer check
+        Table.objects.filter(pk=self.table_id).update(entries_count=Greatest(F("entries_count") - 1, 0))
+        return result
+
     # def clean_fields(self, exclude=None):
     #     super().clean_fields(exclude=exclude)
 
 
+@receiver(post_save, sender=Entry)
+def increment_entries_count(sender, instance, created, **kwargs):
+    if created:
+        Table.objects.filter(pk=instance.table_id).update(entries_count=F("entries_count") + 1)
+
 
 class FilterJoinTable(models.Model):
     """
@@ -327,7 +456,7 @@ class FilterJoinTable(models.Model):
         )
 
 
-class Filter(models.Model):
+class Filter(SlugFromNameMixin, models.Model):
     """
     Description: Model Description
     """
@@ -360,8 +489,9 @@ class Filter(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        value = re.sub('_+', '_', self.name)
-        self.slug = slugify(value, allow_unicode=True)
+        if self.name_changed():
+            value = re.sub('_+', '_', self.name)
+            self.slug = slugify(value, allow_unicode=True)
         super().save(*args, **kwargs)
 
 
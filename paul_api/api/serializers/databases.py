@@ -1,43 +1,154 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from guardian.core import ObjectPermissionChecker
-from guardian.shortcuts import get_objects_for_user
-from api.serializers.users import OwnerSerializer
 from api import models
 
 
-class DatabaseTableListDataSerializer(serializers.ModelSerializer):
-    entries = serializers.SerializerMethodField()
-    # last_edit_user = serializers.ReadOnlyField(source='last_edit_user.userprofile.full_name')
-    last_edit_user = OwnerSerializer()
-
-    def get_entries(self, obj):
-        return obj.entries.count()
-
-    class Meta:
-        model = models.Table
-        fields = [
-            "name",
-            "entries",
-            "last_edit_date",
-            "last_edit_user",
-        ]
+# Columns read by DatabaseTableListSerializer, plus the foreign keys
+# Django needs to attach the parent database and the select_related users
+TABLE_LIST_FIELDS = [
+    "id",
+    "database",
+    "name",
+    "active",
+    "last_edit_date",
+    "entries_count",
+    "owner",
+    "last_edit_user",
+    "owner__id",
+    "owner__username",
+    "owner__first_name",
+    "owner__last_name",
+    "last_edit_user__id",
+    "last_edit_user__username",
+    "last_edit_user__first_name",
+    "last_edit_user__last_name",
+]
+
+# Formats the nested last_edit_date like a DateTimeField declared on the serializer would
+date_time_field = serializers.DateTimeField()
+
+
+# values() columns read by table_list_rows, the flat counterpart of DatabaseTableListSerializer
+TABLE_LIST_VALUES = [
+    "id",
+    "name",
+    "active",
+    "last_edit_date",
+    "entries_count",
+    "owner_id",
+    "owner__username",
+    "owner__first_name",
+    "owner__last_name",
+    "last_edit_user_id",
+    "last_edit_user__username",
+    "last_edit_user__first_name",
+    "last_edit_user__last_name",
+]
+
+
+def owner_representation(context, user_id, username, first_name, last_name):
+    """
+    Same output as OwnerSerializer, built without a nested serializer and once per user and request
+    """
+    if user_id is None:
+        return None
+    cache = context.setdefault("owner_representations", {})
+    if user_id not in cache:
+        cache[user_id] = {
+            "url": reverse("user-detail", kwargs={"pk": user_id}, request=context.get("request")),
+            "username": username,
+            "first_name": first_name,
+            "last_name": last_name,
+        }
+    return cache[user_id]
+
+
+def table_list_rows(rows, context):
+    """
+    Renders values() rows of TABLE_LIST_VALUES like DatabaseTableListSerializer,
+    leaving out the tables the user is not allowed to view
+    """
+    checker = context.get("perm_checker")
+    if checker is None:
+        checker = ObjectPermissionChecker(context["request"].user)
+        context["perm_checker"] = checker
+
+    # Unsaved stand-ins are enough for guardian, it only reads the primary key
+    tables = [models.Table(pk=row["id"]) for row in rows]
+    if tables:
+        checker.prefetch_perms(tables)
+
+    data = []
+    for row, table in zip(rows, tables):
+        user_permissions = list(dict.fromkeys(checker.get_perms(table)))
+        if "view_table" not in user_permissions:
+            continue
+        data.append(
+            {
+                "url": reverse("table-detail", kwargs={"pk": row["id"]}, request=context.get("request")),
+                "id": row["id"],
+                "active": row["active"],
+                "owner": owner_representation(
+                    context,
+                    row["owner_id"],
+                    row["owner__username"],
+                    row["owner__first_name"],
+                    row["owner__last_name"],
+                ),
+                "data": {
+                    "name": row["name"],
+                    "entries": row["entries_count"],
+                    "last_edit_date": date_time_field.to_representation(row["last_edit_date"])
+                    if row["last_edit_date"]
+                    else None,
+                    "last_edit_user": owner_representation(
+                        context,
+                        row["last_edit_user_id"],
+                        row["last_edit_user__username"],
+                        row["last_edit_user__first_name"],
+                        row["last_edit_user__last_name"],
+                    ),
+                },
+                "user_permissions": user_permissions,
+            }
+        )
+    return data
+
+
+def include_tables(request):
+    """
+    Whether the request asks for the nested active/archived table lists of the databases (?include_tables=1)
+    """
+    return request is not None and request.query_params.get("include_tables") in ("1", "true")
 
 
 class DatabaseTableListSerializer(serializers.ModelSerializer):
-    owner = OwnerSerializer()
+    owner = serializers.SerializerMethodField()
     data = serializers.SerializerMethodField()
     user_permissions = serializers.SerializerMethodField()
 
+    def user_representation(self, user_id, user):
+        if user_id is None:
+            return None
+        return owner_representation(self.context, user_id, user.username, user.first_name, user.last_name)
+
+    def get_owner(self, obj):
+        return self.user_representation(obj.owner_id, obj.owner)
+
     def get_data(self, obj):
-        serializer = DatabaseTableListDataSerializer(obj, context=self.context)
-        return serializer.data
+        return {
+            "name": obj.name,
+            "entries": obj.entries_count,
+            "last_edit_date": date_time_field.to_representation(obj.last_edit_date) if obj.last_edit_date else None,
+            "last_edit_user": self.user_representation(obj.last_edit_user_id, obj.last_edit_user),
+        }
 
     def get_user_permissions(self, obj):
-        user = self.context["request"].user
-        checker = ObjectPermissionChecker(user)
-
-        user_perms = checker.get_perms(obj)
-        return user_perms
+        # The caller puts an ObjectPermissionChecker with the listed tables prefetched in the context.
+        # Prefetched permissions repeat a codename granted both to the user and to one of its groups,
+        # they are deduplicated in the checker's order so the output is stable
+        return list(dict.fromkeys(self.context["perm_checker"].get_perms(obj)))
 
     class Meta:
         model = models.Table
@@ -47,6 +158,8 @@ class DatabaseTableListSerializer(serializers.ModelSerializer):
 class DatabaseSerializer(serializers.HyperlinkedModelSerializer):
     active_tables = serializers.SerializerMethodField()
     archived_tables = serializers.SerializerMethodField()
+    active_tables_url = serializers.SerializerMethodField()
+    archived_tables_url = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Database
@@ -56,30 +169,49 @@ class DatabaseSerializer(serializers.HyperlinkedModelSerializer):
             "name",
             "active_tables",
             "archived_tables",
+            "active_tables_url",
+            "archived_tables_url",
         ]
 
+    def get_fields(self):
+        # The nested table lists are unbounded, so by default only the paginated tables urls are given
+        fields = super().get_fields()
+        if not include_tables(self.context.get("request")):
+            fields.pop("active_tables")
+            fields.pop("archived_tables")
+        return fields
+
+    def get_permission_checker(self):
+        # A single checker per request, shared with the nested table serializers
+        if "perm_checker" not in self.context:
+            self.context["perm_checker"] = ObjectPermissionChecker(self.context["request"].user)
+        return self.context["perm_checker"]
+
     def get_active_tables(self, obj):
-        user = self.context['request'].user
-        checker = ObjectPermissionChecker(user)
-
-        tables = obj.active_tables()
-        queryset = []
-        for table in tables:
-            user_perms = checker.get_perms(table)
-            if 'view_table' in user_perms:
-                queryset.append(table)
-        serializer = DatabaseTableListSerializer(queryset, many=True, read_only=True, context=self.context)
-        return serializer.data
+        return self._tables_payload(obj, active=True)
 
     def get_archived_tables(self, obj):
-        user = self.context['request'].user
-        checker = ObjectPermissionChecker(user)
-
-        tables = obj.archived_tables()
-        queryset = []
-        for table in tables:
-            user_perms = checker.get_perms(table)
-            if 'view_table' in user_perms:
-                queryset.append(table)
+        return self._tables_payload(obj, active=False)
+
+    def get_active_tables_url(self, obj):
+        return self._tables_url(obj, active=True)
+
+    def get_archived_tables_url(self, obj):
+        return self._tables_url(obj, active=False)
+
+    def _tables_url(self, obj, active):
+        # Paginated alternative to the nested lists, served by DatabaseViewSet.tables
+        url = reverse("database-tables", kwargs={"pk": obj.pk}, request=self.context.get("request"))
+        return "{}?active={}".format(url, "true" if active else "false")
+
+    def _tables_payload(self, obj, active):
+        checker = self.get_permission_checker()
+
+        tables = obj.active_tables() if active else obj.archived_tables()
+        if not isinstance(tables, list):
+            tables = list(tables.only(*TABLE_LIST_FIELDS))
+        if tables:
+            checker.prefetch_perms(tables)
+        queryset = [table for table in tables if "view_table" in checker.get_perms(table)]
         serializer = DatabaseTableListSerializer(queryset, many=True, read_only=True, context=self.context)
-        return serializer.data
\ No newline at end of file
+        return serializer.data
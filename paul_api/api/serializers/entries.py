@@ -36,7 +36,11 @@ class EntryDataSerializer(serializers.ModelSerializer):
         table = kwargs.get("context", {}).get("table")
 
         if table:
-            table_fields = {field.name: field for field in table.fields.all()}
+            # Build the field map once per serialization, not for every entry of a list
+            table_fields = kwargs["context"].get("table_fields")
+            if table_fields is None:
+                table_fields = {field.name: field for field in table.fields.all()}
+                kwargs["context"]["table_fields"] = table_fields
 
         super(EntryDataSerializer, self).__init__(*args, **kwargs)
 
@@ -86,8 +90,7 @@ class EntrySerializer(serializers.ModelSerializer):
                     try:
                         # datetime.strptime(field_value, "%Y-%m-%dT%H:%M:%S%z")
                         isoparse(field_value)
-                    except Exception as e:
-                        print(e)
+                    except Exception:
                         errors[field_name] = "Invalid date format"
                 elif field.field_type == "enum":
                     if field_value not in field.choices:
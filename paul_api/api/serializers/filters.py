@@ -8,7 +8,52 @@ from api import models
 from api.serializers.tables import TableColumnSerializer
 
 
+class FilterEntryListSerializer(serializers.ListSerializer):
+    """
+    Serializes a page of entry values, renaming their data__ keys to the filter field names on the way.
+
+    context["table_slug"] prefixes the page's own keys. When the filter joins two tables,
+    the page holds the secondary entries and context["primary_table_slug"] prefixes the
+    matching primary values, read from each row's "primary_data".
+    """
+
+    def to_representation(self, data):
+        fields = self.child.fields
+        table_prefix = "{}__".format(self.context["table_slug"])
+        primary_table_slug = self.context.get("primary_table_slug")
+        if primary_table_slug:
+            primary_prefix = "{}__".format(primary_table_slug)
+            # (field name, primary data key) pairs
+            primary_table_fields = [
+                (x, x[len(primary_prefix):]) for x in self.context["fields"] if x.startswith(primary_prefix)
+            ]
+
+        # The values rows all share the same keys, so they are renamed once for the page
+        row_keys = {}
+        representation = []
+        for entry in data:
+            if not row_keys:
+                row_keys = {
+                    key: table_prefix + key[len("data__"):] if key.startswith("data__") else key for key in entry
+                }
+            row = {row_keys[key]: value for key, value in entry.items()}
+            if primary_table_slug:
+                primary_data = row.pop("primary_data") or {}
+                for field_name, key in primary_table_fields:
+                    row[field_name] = primary_data.get(key)
+            representation.append(
+                {
+                    field_name: None if row[field_name] is None else field.to_representation(row[field_name])
+                    for field_name, field in fields.items()
+                }
+            )
+        return representation
+
+
 class FilterEntrySerializer(serializers.Serializer):
+    class Meta:
+        list_serializer_class = FilterEntryListSerializer
+
     def __init__(self, *args, **kwargs):
         fields = kwargs.get("context", {}).get("fields")
 
@@ -33,7 +78,7 @@ class FilterListDataSerializer(serializers.ModelSerializer):
 
     def get_tables(self, obj):
         if obj.primary_table:
-            tables = [obj.primary_table.table.name] + list(obj.join_tables.values_list("table__name", flat=True))
+            tables = [obj.primary_table.table.name] + [join_table.table.name for join_table in obj.join_tables.all()]
             return tables
         return "-"
 
@@ -141,13 +186,14 @@ class FilterDetailSerializer(serializers.ModelSerializer):
             for field in obj.default_fields.all():
                 all_fields.append('{}__{}'.format(field.table.slug, field.name))
         else:
+            # A join table's fields all belong to its table, so the default ordering is by id
             all_fields = [
-                "{}__{}".format(primary_table.table.slug, x.name) for x in primary_table.fields.all().order_by("id")
+                "{}__{}".format(primary_table.table.slug, x.name) for x in primary_table.fields.all()
             ]
             if obj.join_tables.all():
                 secondary_table = obj.join_tables.all()[0]
                 all_fields += [
-                    "{}__{}".format(secondary_table.table.slug, x.name) for x in secondary_table.fields.all().order_by("id")
+                    "{}__{}".format(secondary_table.table.slug, x.name) for x in secondary_table.fields.all()
                 ]
         return all_fields
 
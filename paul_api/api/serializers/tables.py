@@ -1,6 +1,5 @@
 from django.utils import timezone
 from django.urls import reverse
-from django.contrib.auth.models import Group
 from rest_framework import serializers
 
 from rest_framework_guardian.serializers import ObjectPermissionsAssignmentMixin
@@ -158,7 +157,7 @@ class TableCreateSerializer(ObjectPermissionsAssignmentMixin, serializers.ModelS
 
     def get_permissions_map(self, created):
         current_user = self.context["request"].user
-        admins = Group.objects.get(name="admin")
+        admins = models.get_admin_group()
 
         return {
             "view_table": [current_user, admins],
@@ -173,6 +172,7 @@ class TableSerializer(serializers.ModelSerializer):
     last_edit_user = UserSerializer(read_only=True)
     fields = TableColumnSerializer(many=True)
     entries = serializers.SerializerMethodField()
+    entries_count = serializers.IntegerField(read_only=True)
     default_fields = serializers.SerializerMethodField()
 
     class Meta:
@@ -196,9 +196,11 @@ class TableSerializer(serializers.ModelSerializer):
         ]
 
     def get_default_fields(self, obj):
-        if obj.default_fields.all():
-            return [x for x in obj.default_fields.values_list("name", flat=True).order_by("id")]
-        return [x for x in obj.fields.values_list("name", flat=True).order_by("id")]
+        # The table fields are ordered by id, and read from the prefetch cache when there is one
+        default_fields = obj.default_fields.all()
+        if default_fields:
+            return [x.name for x in default_fields]
+        return [x.name for x in obj.fields.all()]
 
     def get_entries(self, obj):
         return self.context["request"].build_absolute_uri(reverse("table-entries-list", kwargs={"table_pk": obj.pk}))
@@ -3,6 +3,7 @@ from django.db.models import (
     DateTimeField, CharField, FloatField, IntegerField, Q)
 from django.db.models.functions import Trunc, Cast
 from django.contrib.postgres.fields.jsonb import KeyTextTransform
+from django.db import connection
 from django.urls import reverse
 from django.utils import timezone
 
@@ -10,7 +11,9 @@ from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import get_template
 
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from itertools import islice
 import inflection
 
 # from api.views import FilterViewSet
@@ -20,7 +23,10 @@ from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import requests
 import re
-from pprint import pprint
+import codecs
+import csv
+import io
+import json
 
 DB_FUNCTIONS = {
     "Count": Count,
@@ -47,6 +53,78 @@ def snake_case(text):
     return re.sub('_+', '_', value)
 
 
+class Echo:
+    """
+    File-like object for csv writers: each write returns the formatted row instead of storing it,
+    so the rows can be yielded to a StreamingHttpResponse
+    """
+
+    def write(self, value):
+        return value
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of up to size items from the iterable
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def csv_file_encoding(file):
+    """
+    UTF-8 when the whole file decodes as such, Windows-1252 otherwise. Checked chunk by chunk
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for chunk in file.chunks():
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "windows-1252"
+    finally:
+        file.seek(0)
+    return "utf-8"
+
+
+@contextmanager
+def csv_dict_reader(file, delimiter=None):
+    """
+    DictReader over a stored CSV file, reading the rows from disk as they are consumed.
+    Without a delimiter, it is sniffed from the start of the file
+    """
+    with file.open("rb"):
+        text_file = io.TextIOWrapper(file, encoding=csv_file_encoding(file), newline="")
+        try:
+            if not delimiter:
+                delimiter = csv.Sniffer().sniff(text_file.read(2000)).delimiter
+                text_file.seek(0)
+            yield csv.DictReader(text_file, delimiter=delimiter)
+        finally:
+            # Otherwise the wrapper closes the file when it is garbage-collected
+            text_file.detach()
+
+
+def csv_fieldnames(file, delimiter=None):
+    """
+    Header of an uploaded CSV file, read without decoding the rest of the file.
+    Without a delimiter, it is sniffed from the start of the file
+    """
+    text_file = io.TextIOWrapper(file, encoding=csv_file_encoding(file), newline="")
+    try:
+        if not delimiter:
+            delimiter = csv.Sniffer().sniff(text_file.read(2000)).delimiter
+            text_file.seek(0)
+        return csv.DictReader(text_file, delimiter=delimiter).fieldnames
+    finally:
+        # Leaves the upload open, so it can still be saved
+        text_file.detach()
+        file.seek(0)
+
+
 def import_csv(reader, table, csv_import=None):
     errors_count = 0
     import_count_created = 0
@@ -96,8 +174,6 @@ def import_csv(reader, table, csv_import=None):
                         else:
                             entry_dict[field_name] = row[key]
                     else:
-                        print(table_fields)
-                        print(csv_field_mapping)
                         if table_fields[field_name].required or csv_field_mapping[key].required:
                             error_in_row = True
                             errors_in_row[key] = "Acest câmp este obligatoriu"
@@ -413,29 +489,53 @@ def prepare_chart_data(chart, chart_data, timeline=True):
     return data
 
 
+# Column types whose values are never arrays or objects
+SCALAR_FIELD_TYPES = {"text", "int", "float", "date"}
+
+
+def data_exact_q(key, value, column_type):
+    """
+    A plain equality on a scalar column is written as a containment test, so the GIN index on the entry
+    data can serve it. The two only agree for scalar values: an array or object value would also match
+    when it merely contains the requested value, so other columns keep the data__<key> equality
+    """
+    if "__" in key or column_type not in SCALAR_FIELD_TYPES:
+        return Q(**{"data__{}".format(key): value})
+    return Q(data__contains={key: value})
+
+
+# Converts the GET filter values of the column types not stored as text
+FILTER_VALUE_CONVERTERS = {
+    "float": float,
+    "int": float,
+}
+
+
 def request_get_to_filter(request, table_fields, filter_dict=Q(), is_filter=False):
     # print(request)
-    for key in request:
+    """
+    table_fields maps the column names (prefixed by the table slug for filters) to their field types
+    """
+    for param in request:
+        key = param
         if is_filter:
-            table = key.split("__")[0]
-            filter_table_field = "__".join(key.split("__")[:2])
-            key = "__".join(key.split("__")[1:])
+            table, _, key = key.partition("__")
+            filter_table_field = "{}__{}".format(table, key.partition("__")[0])
 
             filter_dict.setdefault(table, {})
             filter_dict_table = filter_dict[table]
         else:
             filter_dict_table = filter_dict
             filter_table_field = ''
-        column = key.split("__")[0]
+        column = key.partition("__")[0]
 
-        if key and (column in table_fields.keys() or filter_table_field in table_fields.keys()):
+        if key and (column in table_fields or filter_table_field in table_fields):
             if is_filter:
                 column_type = table_fields[filter_table_field]
-                value = request.get(table + '__' + key).split(",")
             else:
                 column_type = table_fields[column]
-                value = request.get(key).split(",")
-            key_lookup = key.split("__")[-1]
+            value = request.get(param).split(",")
+            key_lookup = key.rpartition("__")[2]
 
             if len(value) == 1:
                 value = value[0]
@@ -449,12 +549,13 @@ def request_get_to_filter(request, table_fields, filter_dict=Q(), is_filter=Fals
                         **{"data__{}".format(key): ''})
                     )
             else:
-                if column_type in [
-                    "float",
-                    "int",
-                ]:
-                    filter_dict_table = filter_dict_table & Q(
-                        **{"data__{}".format(key): float(value)})
+                if column_type in FILTER_VALUE_CONVERTERS:
+                    convert = FILTER_VALUE_CONVERTERS[column_type]
+                    if isinstance(value, list):
+                        value = [convert(x) for x in value]
+                    else:
+                        value = convert(value)
+                    filter_dict_table = filter_dict_table & data_exact_q(key, value, column_type)
                 else:
                     if column_type == 'date':
                         if key_lookup == 'relative':
@@ -467,7 +568,6 @@ def request_get_to_filter(request, table_fields, filter_dict=Q(), is_filter=Fals
                                 relative_increment = 0 if relative_type == 'current' else 1
                                 relative_increment_dict[relative_period] = relative_increment
                                 date_start = today + relativedelta(**relative_increment_dict)
-                                pprint(relative_increment_dict)
                             else:
                                 relative_increment_dict[relative_period] = 1
                                 date_start = today - relativedelta(**relative_increment_dict)
@@ -490,24 +590,249 @@ def request_get_to_filter(request, table_fields, filter_dict=Q(), is_filter=Fals
                                 **{"data__{}__lt".format(column): date_start + relativedelta(**{relative_period:1})})
                         else:
                             # filter_dict_table["data__{}".format(key)] = value
-                            filter_dict_table = filter_dict_table & Q(
-                                **{"data__{}".format(key): value})
+                            filter_dict_table = filter_dict_table & data_exact_q(key, value, column_type)
                             # filter_dict_table = {'data__data_nasterii__gte': '1987-06-25'}
                             # print(key, value[:10])
                             # print('===')
 
                     else:
-                        filter_dict_table = filter_dict_table & Q(
-                                **{"data__{}".format(key): value})
+                        filter_dict_table = filter_dict_table & data_exact_q(key, value, column_type)
                         # filter_dict_table["data__{}".format(key)] = value
         if is_filter:
             filter_dict[table] = filter_dict_table
         else:
             filter_dict = filter_dict_table
-    pprint(filter_dict)
     return filter_dict
 
 
+FilterQuery = namedtuple(
+    "FilterQuery",
+    [
+        "primary_table",
+        "secondary_table",
+        "fields",
+        "primary_table_fields",
+        "secondary_table_fields",
+        "filter_dict",
+        "order_table",
+        "order_by",
+    ],
+)
+
+
+def resolve_filter(filter, query_params, use_default_fields=True):
+    """
+    Reads the tables, the displayed fields, the ordering and the entry filters of a filter view.
+    The table fields and default fields are expected to be prefetched
+    """
+    primary_table = filter.primary_table
+    primary_table_slug = primary_table.table.slug
+    join_tables = filter.join_tables.all()
+    secondary_table = join_tables[0] if join_tables else None
+    secondary_table_slug = secondary_table.table.slug if secondary_table else None
+
+    # Get all fields and display fields
+    default_fields = filter.default_fields.all() if use_default_fields else []
+    filter_tables = [primary_table] + ([secondary_table] if secondary_table else [])
+    all_fields = []
+    field_types = {}
+    for join_table in filter_tables:
+        for field in join_table.fields.all():
+            if not default_fields or field in default_fields:
+                field_key = "{}__{}".format(join_table.table.slug, field.name)
+                all_fields.append(field_key)
+                field_types[field_key] = field.field_type
+
+    str_fields = query_params.get("__fields", "")
+    fields = all_fields
+    if str_fields and str_fields != "ALL":
+        fields = str_fields.split(",")
+
+    primary_table_fields = []
+    secondary_table_fields = []
+    for field in fields:
+        if field.startswith(primary_table_slug):
+            primary_table_fields.append(field.replace(primary_table_slug + "__", "data__"))
+        else:
+            secondary_table_fields.append(field.replace("{}__".format(secondary_table_slug), "data__"))
+
+    if secondary_table:
+        secondary_table_fields.append("data__{}".format(secondary_table.join_field.name))
+
+    if not fields:
+        fields = [x.replace("data__", "{}__".format(primary_table_slug)) for x in primary_table_fields]
+        fields += [x.replace("data__", "{}__".format(secondary_table_slug)) for x in secondary_table_fields]
+
+    # "[-]<table slug>__<field>"
+    str_order = query_params.get("__order", "")
+    order_table = str_order.split("__")[0]
+    str_order = str_order.replace(order_table + "__", "")
+    if order_table.startswith("-"):
+        order_table = order_table[1:]
+        order_by = "-data__{}".format(str_order)
+    else:
+        order_by = "data__{}".format(str_order)
+    if not str_order:
+        order_by = "id"
+
+    # Create filters dict
+    filter_dict = {join_table.table.slug: Q() for join_table in filter_tables}
+    filter_dict = request_get_to_filter(query_params, field_types, filter_dict, True)
+
+    return FilterQuery(
+        primary_table,
+        secondary_table,
+        fields,
+        primary_table_fields,
+        secondary_table_fields,
+        filter_dict,
+        order_table,
+        order_by,
+    )
+
+
+def filter_entries_values(filter_query):
+    """
+    Values of the entries listed by a filter view, ordered for display.
+
+    With a secondary table, the secondary entries are listed and each row holds the
+    data of the matching primary entry (the newest one) under "primary_data"
+    """
+    primary_table = filter_query.primary_table
+    secondary_table = filter_query.secondary_table
+    primary_table_filter = filter_query.filter_dict[primary_table.table.slug]
+    listed_table = secondary_table or primary_table
+
+    # The id breaks the ties of a data key ordering, so the LIMIT/OFFSET pages don't overlap
+    table_order_by = ["id"]
+    if filter_query.order_table == listed_table.table.slug and filter_query.order_by != "id":
+        table_order_by = [filter_query.order_by, "id"]
+
+    if not secondary_table:
+        return (
+            models.Entry.objects.filter(table=primary_table.table)
+            .filter(primary_table_filter)
+            .values(*filter_query.primary_table_fields)
+            .order_by(*table_order_by)
+        )
+
+    primary_entries = (
+        models.Entry.objects.filter(table=primary_table.table)
+        .filter(primary_table_filter)
+        .exclude(data=None)
+        .values("id", "data")
+    )
+    secondary_entries = (
+        models.Entry.objects.filter(table=secondary_table.table)
+        .filter(filter_query.filter_dict[secondary_table.table.slug])
+        .values("id", "data")
+    )
+    return JoinedEntriesValues(
+        primary_entries,
+        secondary_entries,
+        primary_table.join_field.name,
+        secondary_table.join_field.name,
+        [field[len("data__"):] for field in filter_query.secondary_table_fields],
+        table_order_by,
+    )
+
+
+class JoinedEntriesValues:
+    """
+    Values rows of the secondary entries of a filter, each with the data of the matching primary entry
+    (the newest one) under "primary_data".
+
+    PostgreSQL joins the two tables on the join fields in a single query, hashing the primary entries
+    once instead of looking them up for every secondary entry. Supports count() and slicing, so it can
+    be given to a Paginator, and iterator() for exports
+    """
+
+    ordered = True
+
+    def __init__(
+        self, primary_entries, secondary_entries, primary_join_field, secondary_join_field, fields, order_by
+    ):
+        self.fields = fields
+
+        primary_sql, primary_params = primary_entries.query.sql_with_params()
+        secondary_sql, secondary_params = secondary_entries.query.sql_with_params()
+        self.with_sql = """
+            WITH primary_entries AS (
+                SELECT DISTINCT ON (data -> %s) data -> %s AS join_value, data
+                FROM (""" + primary_sql + """) AS primary_rows
+                WHERE data -> %s IS NOT NULL
+                ORDER BY data -> %s, id DESC
+            )
+            SELECT """
+        self.from_sql = """
+            FROM (""" + secondary_sql + """) AS secondary_entries
+            JOIN primary_entries ON secondary_entries.data -> %s = primary_entries.join_value"""
+        self.join_params = (
+            [primary_join_field, primary_join_field]
+            + list(primary_params)
+            + [primary_join_field, primary_join_field]
+            + list(secondary_params)
+            + [secondary_join_field]
+        )
+
+        # The orderings resolve_filter() builds: "id" or "[-]data__<key>"
+        order_by_sql = []
+        self.order_by_params = []
+        for ordering in order_by:
+            direction = " DESC" if ordering.startswith("-") else ""
+            ordering = ordering.lstrip("-")
+            if ordering == "id":
+                order_by_sql.append("secondary_entries.id" + direction)
+            else:
+                order_by_sql.append("secondary_entries.data -> %s" + direction)
+                self.order_by_params.append(ordering[len("data__"):])
+        self.order_by_sql = ", ".join(order_by_sql)
+
+    def _rows_query(self):
+        query = self.with_sql + "secondary_entries.data, primary_entries.data" + self.from_sql
+        query += " ORDER BY " + self.order_by_sql
+        return query, self.join_params + self.order_by_params
+
+    def _values(self, rows):
+        values = []
+        for secondary_data, primary_data in rows:
+            # Django leaves the decoding of jsonb columns to the model fields, raw rows hold JSON strings
+            secondary_data = json.loads(secondary_data) if secondary_data else {}
+            row = {"data__{}".format(name): secondary_data.get(name) for name in self.fields}
+            row["primary_data"] = json.loads(primary_data) if primary_data else None
+            values.append(row)
+        return values
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(self.with_sql + "COUNT(*)" + self.from_sql, self.join_params)
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice) or k.step:
+            raise TypeError("JoinedEntriesValues only supports slicing without a step")
+        start = k.start or 0
+        query, params = self._rows_query()
+        if k.stop is not None:
+            query += " LIMIT %s"
+            params.append(max(k.stop - start, 0))
+        query += " OFFSET %s"
+        params.append(start)
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return self._values(cursor.fetchall())
+
+    def iterator(self, chunk_size=1000):
+        query, params = self._rows_query()
+        # A server-side cursor, so the rows are fetched as they are consumed
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchmany(chunk_size)
+            while rows:
+                yield from self._values(rows)
+                rows = cursor.fetchmany(chunk_size)
+
+
 def get_card_data(request, card, table, preview=False):
     data_column_function = DB_FUNCTIONS[card.data_column_function]
 
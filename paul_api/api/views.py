@@ -1,12 +1,13 @@
 from django.db.models import (
-    Q, Count, Sum, Min, Max, Avg, StdDev,
+    Q, Count, Prefetch, prefetch_related_objects, Sum, Min, Max, Avg, StdDev,
     DateTimeField, DateField, CharField, FloatField, IntegerField)
 from django.db.models.functions import Trunc, Cast
-from django.contrib.auth.models import User, Group
-from django.http import HttpResponse
-from django.core.paginator import Paginator
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
 from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.postgres.fields.jsonb import KeyTextTransform
+from django.db import connection, transaction
+from django.utils import timezone
 
 from rest_framework import viewsets
 from rest_framework import status
@@ -20,6 +21,8 @@ from rest_framework_guardian.filters import ObjectPermissionsFilter
 from guardian.shortcuts import get_objects_for_user
 from guardian.core import ObjectPermissionChecker
 
+from psycopg2.extras import execute_values
+
 from rest_framework import filters as drf_filters
 from django_filters import rest_framework as filters
 from rest_framework_tricks.filters import OrderingFilter
@@ -29,7 +32,6 @@ from rest_framework_tricks.filters import OrderingFilter
 import csv
 import json
 from io import StringIO
-import os
 from datetime import datetime
 
 from api import serializers, models
@@ -40,7 +42,7 @@ from pprint import pprint
 
 
 class EntriesPagination(PageNumberPagination):
-    page_size = 10
+    page_size = 50
     page_size_query_param = "perPage"
     max_page_size = 1000
 
@@ -58,6 +60,29 @@ class EntriesPagination(PageNumberPagination):
         )
 
 
+def filters_with_tables():
+    """
+    Filters with their join tables, join fields, table fields and default fields prefetched
+    """
+    ordered_fields = models.TableColumn.objects.order_by("id")
+    return models.Filter.objects.select_related(
+        "primary_table__table", "primary_table__join_field"
+    ).prefetch_related(
+        Prefetch("primary_table__fields", queryset=ordered_fields),
+        Prefetch("join_tables", queryset=models.FilterJoinTable.objects.select_related("table", "join_field")),
+        Prefetch("join_tables__fields", queryset=ordered_fields),
+        Prefetch("default_fields", queryset=models.TableColumn.objects.select_related("table")),
+    )
+
+
+def user_view_tables(user, accept_global_perms=False):
+    """
+    Tables the user may view, as a queryset to filter by without checking each table.
+    Only object permissions count, unless accept_global_perms lets the global view_table permission in
+    """
+    return get_objects_for_user(user, "api.view_table", accept_global_perms=accept_global_perms)
+
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = serializers.users.UserListSerializer
@@ -76,9 +101,11 @@ class UserViewSet(viewsets.ModelViewSet):
         user = self.request.user
         ordering = self.request.GET.get('__order', 'id')
 
-        if 'admin' in user.groups.values_list('name', flat=True):
-            return User.objects.all().order_by(ordering)
-        return User.objects.filter(pk=user.pk)
+        # The user serializers read the avatar from the profile
+        queryset = User.objects.select_related("userprofile")
+        if models.is_admin(user):
+            return queryset.order_by(ordering)
+        return queryset.filter(pk=user.pk)
 
     @action(
         detail=True,
@@ -89,7 +116,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def toggle_activation(self, request, pk):
         request_user = request.user
         user = self.get_object()
-        if 'admin' in request_user.groups.values_list('name', flat=True):
+        if models.is_admin(request_user):
             user.is_active = not user.is_active
             user.save()
         response = serializers.users.UserDetailSerializer(
@@ -111,8 +138,20 @@ class UserView(APIView):
         """
         user = request.user
         profile = user.userprofile
+        # Fill the caches of the profile the serializers reach through request.user.userprofile
+        prefetch_related_objects(
+            [profile],
+            Prefetch("dashboard_cards", queryset=models.UserCard.objects.select_related("card__table", "card__owner")),
+            Prefetch("dashboard_charts", queryset=models.Chart.objects.select_related("table", "owner")),
+            Prefetch(
+                "dashboard_filters",
+                queryset=models.Filter.objects.select_related("primary_table__table", "owner").prefetch_related(
+                    "join_tables__table"
+                ),
+            ),
+            "cards",
+        )
         profile_cards = [card.card for card in profile.dashboard_cards.all()]
-        admin_group = Group.objects.get(name='admin')
 
         cards_serializer = serializers.cards.ListSerializer(
             profile_cards, many=True, context={'request': request})
@@ -131,7 +170,7 @@ class UserView(APIView):
             "username": user.username,
             "id": user.id,
             "dashboard": dashboard,
-            "is_admin": admin_group in user.groups.all(),
+            "is_admin": models.is_admin(user),
             "avatar": request.build_absolute_uri(profile.avatar.url) if profile.avatar else None
         }
         return Response(response)
@@ -141,6 +180,43 @@ class DatabaseViewSet(viewsets.ModelViewSet):
     queryset = models.Database.objects.all()
     serializer_class = serializers.databases.DatabaseSerializer
 
+    def get_queryset(self):
+        tables = (
+            models.Table.objects.select_related("owner", "last_edit_user")
+            .only(*serializers.databases.TABLE_LIST_FIELDS)
+            .order_by("id")
+        )
+        queryset = super().get_queryset()
+        if self.action == "tables" or not serializers.databases.include_tables(self.request):
+            return queryset
+        # One query for the tables of all the databases, split into active/archived by the model
+        return queryset.prefetch_related(Prefetch("tables", queryset=tables))
+
+    def filter_queryset(self, queryset):
+        # The default DjangoFilterBackend has no filterset here, so only run it when asked to filter
+        if not self.request.query_params:
+            return queryset
+        return super().filter_queryset(queryset)
+
+    @action(detail=True, methods=["get"])
+    def tables(self, request, pk):
+        """
+        Paginated tables of the database the user can view, optionally only the active/archived ones (?active=true|false)
+        """
+        database = self.get_object()
+        tables = database.tables.all()
+        active = request.GET.get("active")
+        if active is not None:
+            tables = tables.filter(active=active.lower() == "true")
+
+        # Filter on the object permissions in SQL so every page is full
+        tables = get_objects_for_user(request.user, "api.view_table", klass=tables, accept_global_perms=False)
+        rows = tables.order_by("id").values(*serializers.databases.TABLE_LIST_VALUES)
+
+        paginator = EntriesPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        return paginator.get_paginated_response(serializers.databases.table_list_rows(page, {"request": request}))
+
 
 class CanView(permissions.BasePermission):
     """
@@ -172,6 +248,13 @@ class TableViewSet(viewsets.ModelViewSet):
     filter_backends = [ObjectPermissionsFilter]
     # filterset_fields = ["active"]
 
+    def get_queryset(self):
+        # Both the list and the detail serializers show the owner and the last editor
+        queryset = super().get_queryset().select_related("owner", "last_edit_user")
+        if self.action == "retrieve":
+            queryset = queryset.prefetch_related("default_fields")
+        return queryset
+
     def get_serializer_class(self):
         if self.action == "list":
             return serializers.databases.DatabaseTableListSerializer
@@ -185,6 +268,22 @@ class TableViewSet(viewsets.ModelViewSet):
             base_permissions = (api_permissions.IsAuthenticatedOrGetToken(),)
         return base_permissions
 
+    def list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        tables = list(page if page is not None else queryset)
+
+        checker = ObjectPermissionChecker(request.user)
+        if tables:
+            checker.prefetch_perms(tables)
+        context = self.get_serializer_context()
+        context["perm_checker"] = checker
+
+        serializer = self.get_serializer_class()(tables, many=True, context=context)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
     def create(self, request):
         fields = request.data.get("fields")
         csv_import_pk = request.data.get("import_id")
@@ -204,42 +303,47 @@ class TableViewSet(viewsets.ModelViewSet):
         table = models.Table.objects.get(pk=serializer.data["id"])
         csv_import = models.CsvImport.objects.get(pk=csv_import_pk)
 
+        # Columns created along with the table are reused, the others are inserted in one go
+        table_columns = {
+            (column.name, column.display_name, column.field_type): column for column in table.fields.all()
+        }
+        new_columns = []
+        csv_field_maps = []
         for field in fields:
-            table_column, _ = models.TableColumn.objects.get_or_create(
-                table=table,
-                name=utils.snake_case(field["display_name"]),
-                display_name=field["display_name"],
-                field_type=field["field_type"],
-            )
-            csv_field_map = models.CsvFieldMap.objects.create(
-                table=table,
-                original_name=field["original_name"],
-                display_name=field["display_name"],
-                field_type=field["field_type"],
-                field_format=field["field_format"],
-                table_column=table_column
-            )
+            column_key = (utils.snake_case(field["display_name"]), field["display_name"], field["field_type"])
+            table_column = table_columns.get(column_key)
+            if table_column is None:
+                table_column = models.TableColumn(
+                    table=table,
+                    name=column_key[0],
+                    display_name=field["display_name"],
+                    field_type=field["field_type"],
+                )
+                table_columns[column_key] = table_column
+                new_columns.append(table_column)
             table_column.required = field.get('required', False)
             table_column.unique = field.get('unique', False)
-            table_column.save()
-            csv_field_map.required = field.get('required', False)
-            csv_field_map.unique = field.get('unique', False)
-            csv_field_map.save()
 
-        try:
-            file_content = csv_import.file.read().decode("utf-8")
-        except:
-            csv_import.file.seek(0)
-            file_content = csv_import.file.read().decode("windows-1252")
-        decoded_file = file_content.splitlines()
-        if not csv_import.delimiter:
-            csv_import.file.seek(0)
-            dialect = csv.Sniffer().sniff(file_content[:2000])
-            reader = csv.DictReader(decoded_file, delimiter=dialect.delimiter)
-        else:
-            reader = csv.DictReader(decoded_file, delimiter=csv_import.delimiter)
+            csv_field_maps.append(
+                models.CsvFieldMap(
+                    table=table,
+                    original_name=field["original_name"],
+                    display_name=field["display_name"],
+                    field_type=field["field_type"],
+                    field_format=field["field_format"],
+                    required=field.get('required', False),
+                    unique=field.get('unique', False),
+                    table_column=table_column,
+                )
+            )
+
+        existing_columns = [column for column in table_columns.values() if column not in new_columns]
+        models.TableColumn.objects.bulk_update(existing_columns, ["required", "unique"])
+        models.TableColumn.bulk_create_with_slugs(new_columns)
+        models.CsvFieldMap.objects.bulk_create(csv_field_maps, batch_size=500)
 
-        errors, errors_count, import_count_created, import_count_updated = utils.import_csv(reader, table)
+        with utils.csv_dict_reader(csv_import.file, csv_import.delimiter) as reader:
+            errors, errors_count, import_count_created, import_count_updated = utils.import_csv(reader, table)
         csv_import.errors = errors
         csv_import.errors_count = errors_count
         csv_import.import_count_created = import_count_created
@@ -284,21 +388,9 @@ class TableViewSet(viewsets.ModelViewSet):
             csv_field_map.save()
 
 
-        try:
-            file_content = csv_import.file.read().decode("utf-8")
-        except:
-            csv_import.file.seek(0)
-            file_content = csv_import.file.read().decode("windows-1252")
-        decoded_file = file_content.splitlines()
-        if not csv_import.delimiter:
-            csv_import.file.seek(0)
-            dialect = csv.Sniffer().sniff(file_content[:2000])
-            reader = csv.DictReader(decoded_file, delimiter=dialect.delimiter)
-        else:
-            reader = csv.DictReader(decoded_file, delimiter=csv_import.delimiter)
-
-
-        errors, errors_count, import_count_created, import_count_updated = utils.import_csv(reader, table, csv_import)
+        with utils.csv_dict_reader(csv_import.file, csv_import.delimiter) as reader:
+            errors, errors_count, import_count_created, import_count_updated = utils.import_csv(
+                reader, table, csv_import)
 
         csv_import.errors = errors
         csv_import.errors_count = errors_count
@@ -325,26 +417,29 @@ class TableViewSet(viewsets.ModelViewSet):
     )
     def csv_export(self, request, pk):
         table = models.Table.objects.get(pk=pk)
-        table_fields = {x.name: x for x in table.fields.all()}
+        table_fields = {x.name: x.field_type for x in table.fields.all()}
 
         filter_dict = utils.request_get_to_filter(request.GET, table_fields, Q(), False)
 
         file_name = "{}__{}.csv".format(table.name, datetime.now().strftime("%d.%m.%Y"))
-        with open("/tmp/{}".format(file_name), "w", encoding="utf-8-sig") as csv_export_file:
+
+        def csv_rows():
+            # Byte order mark, so spreadsheet applications detect the UTF-8 encoding
+            yield "\ufeff"
             writer = csv.DictWriter(
-                csv_export_file,
+                utils.Echo(),
                 delimiter=",",
                 quoting=csv.QUOTE_MINIMAL,
-                fieldnames=table.fields.values_list("name", flat=True),
+                fieldnames=list(table_fields.keys()),
             )
-            writer.writeheader()
-            for row in table.entries.filter(filter_dict):
-                writer.writerow(row.data)
-
-        with open("/tmp/{}".format(file_name), "rb") as csv_export_file:
-            response = HttpResponse(csv_export_file.read(), content_type="application/vnd.ms-excel")
-            response["Content-Disposition"] = 'attachment; filename="{}"'.format(file_name)
-        os.remove("/tmp/{}".format(file_name))
+            yield writer.writeheader()
+            # Not table.entries: the related manager would load the deferred table_id of every row
+            entries = models.Entry.objects.filter(table=table).filter(filter_dict).only("data")
+            for row in entries.iterator(chunk_size=2000):
+                yield writer.writerow(row.data)
+
+        response = StreamingHttpResponse(csv_rows(), content_type="application/vnd.ms-excel")
+        response["Content-Disposition"] = 'attachment; filename="{}"'.format(file_name)
         return response
 
     @action(
@@ -353,6 +448,7 @@ class TableViewSet(viewsets.ModelViewSet):
         name="Create from FilterView",
         url_path="from-filter",
     )
+    @transaction.atomic
     def create_from_filter(self, request):
 
         table_name = request.data.get('table_name')
@@ -368,7 +464,7 @@ class TableViewSet(viewsets.ModelViewSet):
         table = models.Table.objects.get(pk=serializer.data["id"])
         # table = models.Table.objects.get(name=table_name)
 
-        filter = models.Filter.objects.get(pk=filter_id)
+        filter = filters_with_tables().get(pk=filter_id)
         filter_tables = [filter.primary_table] + [f for f in filter.join_tables.all()]
         for join_table in filter_tables:
             table_slug = join_table.table.slug
@@ -381,125 +477,72 @@ class TableViewSet(viewsets.ModelViewSet):
                     choices=field.choices,
                 )
 
-        primary_table = filter.primary_table
+        # All the columns of both tables are copied, whatever the filter displays
+        filter_query = utils.resolve_filter(filter, {}, use_default_fields=False)
+        primary_table = filter_query.primary_table
         primary_table_slug = primary_table.table.slug
         primary_table_join_field = primary_table.join_field.name
 
-        secondary_table = filter.join_tables.all()[0]
+        secondary_table = filter_query.secondary_table
         secondary_table_slug = secondary_table.table.slug
         secondary_table_join_field = secondary_table.join_field.name
 
-        # Get all fields and display fields
-        all_fields = []
-        field_types = {}
-        for field in primary_table.fields.all().order_by("id"):
-            field_key = "{}__{}".format(primary_table.table.slug, field.name)
-            all_fields.append(field_key)
-            field_types[field_key] = field.field_type
-        for field in secondary_table.fields.all().order_by("id"):
-            field_key = "{}__{}".format(secondary_table.table.slug, field.name)
-            all_fields.append(field_key)
-            field_types[field_key] = field.field_type
-
-        fields = all_fields
-
-        primary_table_fields = []
-        secondary_table_fields = []
-
-        for field in fields:
-            if field.startswith(primary_table_slug):
-                primary_table_fields.append(field.replace(primary_table_slug + "__", "data__"))
-            else:
-                secondary_table_fields.append(field.replace(secondary_table_slug + "__", "data__"))
-
-        secondary_table_fields.append("data__{}".format(secondary_table_join_field))
-
-        # Create filters dict
-        filter_dict = {
-            primary_table_slug: {},
-            secondary_table_slug: {},
+        secondary_field_names = [field.replace("data__", "", 1) for field in filter_query.secondary_table_fields]
+
+        # Let PostgreSQL join the two tables on the join fields. For a join value found in several primary
+        # entries only the newest one is combined, like the join value -> entry dict built here before.
+        query = """
+            WITH primary_entries AS (
+                SELECT DISTINCT ON (data -> %(primary_join_field)s)
+                    data -> %(primary_join_field)s AS join_value, data
+                FROM {entries}
+                WHERE table_id = %(primary_table)s AND data -> %(primary_join_field)s IS NOT NULL
+                ORDER BY data -> %(primary_join_field)s, id DESC
+            )
+            SELECT secondary_entries.data, primary_entries.data
+            FROM {entries} AS secondary_entries
+            JOIN primary_entries ON secondary_entries.data -> %(secondary_join_field)s = primary_entries.join_value
+            WHERE secondary_entries.table_id = %(secondary_table)s
+            ORDER BY secondary_entries.data -> %(secondary_join_field)s, secondary_entries.id
+        """.format(entries=models.Entry._meta.db_table)
+        params = {
+            "primary_table": primary_table.table_id,
+            "primary_join_field": primary_table_join_field,
+            "secondary_table": secondary_table.table_id,
+            "secondary_join_field": secondary_table_join_field,
         }
 
-        # for key in filter.filters:
-        #     table_field = "__".join(key.split("__")[:2])
-        #     if key and table_field in all_fields:
-        #         table = key.split("__")[0]
-        #         field = key.replace(table + "__", "")
-
-        #         filter_dict.setdefault(table, {})
-        #         value = filter.filters.get(key).split(",")
-
-        #         if len(value) == 1:
-        #             value = value[0]
-        #         else:
-        #             field = field + "__in"
-
-        #         if field_types[table_field] in [
-        #             "float",
-        #             "int",
-        #         ]:
-        #             filter_dict[table]["data__{}".format(field)] = float(value)
-        #         else:
-        #             filter_dict[table]["data__{}".format(field)] = value
-
-        join_values = (
-            models.Entry.objects.filter(table=primary_table.table)
-            .filter(**filter_dict[primary_table_slug])
-            .values("data__{}".format(primary_table_join_field))
+        insert_query = "INSERT INTO {entries} (table_id, data, date_created) VALUES %s".format(
+            entries=models.Entry._meta.db_table
         )
-
-        filter_dict[secondary_table_slug]["data__{}__in".format(secondary_table_join_field)] = join_values
-
-        result_values = (
-            models.Entry.objects.filter(table__slug=secondary_table_slug)
-            .filter(**filter_dict[secondary_table_slug])
-            .values(*secondary_table_fields)
-            .order_by("data__{}".format(secondary_table_join_field))
-        )
-
-        queryset = result_values
-
-        if not fields:
-            fields = [x.replace("data__", "{}__".format(primary_table_slug)) for x in primary_table_fields]
-            fields += [x.replace("data__", "{}__".format(secondary_table_slug)) for x in secondary_table_fields]
-        queryset_count = queryset.count()
-        paginator = Paginator(queryset, 1000)  # Show 100 objects per page, you can choose any other value
-
-        
-        for i in paginator.page_range:  # A 1-based range iterator of page numbers, e.g. yielding [1, 2, 3, 4].
-            # print("Writing page:", i)
-            data = paginator.get_page(i)
-            page = data.object_list
-
-            page_join_values = [x["data__{}".format(secondary_table_join_field)] for x in page]
-
-            filter_dict[primary_table_slug]["data__{}__in".format(primary_table_join_field)] = page_join_values
-            primary_table_values = {
-                x.data[primary_table_join_field]: {"data__" + key: value for key, value in x.data.items()}
-                for x in models.Entry.objects.filter(table=primary_table.table)
-                .filter(**filter_dict[primary_table_slug])
-                .exclude(data=None)
-            }
-            entries = []
-            for entry in page:
-                final_entry = {}
-                final_entry_primary_table_values = {}
-
-                entry_primary_table_values = primary_table_values[
-                    entry["data__{}".format(secondary_table_join_field)]
-                ]
-
-                for key in entry:
-                    final_entry[key.replace("data__", "{}_".format(secondary_table_slug))] = entry[key]
-                for key in entry_primary_table_values:
-                    final_entry_primary_table_values[
-                        key.replace("data__", "{}_".format(primary_table_slug))
-                    ] = entry_primary_table_values[key]
-
-                final_entry.update(final_entry_primary_table_values)
-                entry = models.Entry(table=table, data=final_entry)
-                entries.append(entry)
-            models.Entry.objects.bulk_create(entries)
+        date_created = timezone.now()
+        batch_size = 1000
+
+        # A server-side cursor for the join, so only a batch of joined rows is held in memory at a time
+        with connection.chunked_cursor() as cursor, connection.cursor() as insert_cursor:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                entries = []
+                for secondary_data, primary_data in rows:
+                    # Django leaves the decoding of jsonb columns to the model fields, raw rows hold JSON strings
+                    secondary_data, primary_data = json.loads(secondary_data), json.loads(primary_data)
+
+                    final_entry = {
+                        "{}_{}".format(secondary_table_slug, name): secondary_data.get(name)
+                        for name in secondary_field_names
+                    }
+                    final_entry.update(
+                        {"{}_{}".format(primary_table_slug, key): value for key, value in primary_data.items()}
+                    )
+                    entries.append((table.pk, json.dumps(final_entry, cls=DjangoJSONEncoder), date_created))
+                # A single multi-row INSERT per fetched batch, without building Entry instances
+                execute_values(insert_cursor, insert_query, entries, page_size=batch_size)
+        # The raw inserts do not send the signals that keep the count up to date
+        table.refresh_entries_count()
         response = {
             'id': table.id
         }
@@ -520,20 +563,22 @@ class FilterViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = self.queryset
+        if self.action == "list":
+            queryset = queryset.select_related("primary_table__table", "owner").prefetch_related(
+                "join_tables__table")
+        elif self.action == "retrieve":
+            queryset = filters_with_tables().select_related("owner", "last_edit_user")
         user = self.request.user
-        user_view_tables = []
+        view_tables = user_view_tables(user)
 
-        for table in get_objects_for_user(user, 'api.view_table'):
-            if user.has_perm('view_table', table):
-                user_view_tables.append(table)
         q = Q(
-                primary_table__table__in=user_view_tables,
-                join_tables__table__in=user_view_tables) | \
+                primary_table__table__in=view_tables,
+                join_tables__table__in=view_tables) | \
             Q(
-                primary_table__table__in=user_view_tables,
+                primary_table__table__in=view_tables,
                 join_tables=None
                 )
-        return queryset.filter(q)
+        return queryset.filter(q).distinct()
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -581,183 +626,22 @@ class FilterViewSet(viewsets.ModelViewSet):
 
     @action(methods=["get"], detail=True, url_path="entries", url_name="entries")
     def entries(self, request, pk):
-        obj = models.Filter.objects.filter(pk=pk).prefetch_related("primary_table", "join_tables")[0]
-        str_fields = request.GET.get("__fields", "") if request else None
-        str_order = request.GET.get("__order", "") if request else None
-
-        primary_table = obj.primary_table
-        primary_table_slug = primary_table.table.slug
-
-        is_two_tables_filter = False
-
-        if obj.join_tables.all():
-            primary_table_join_field = primary_table.join_field.name
-            secondary_table = obj.join_tables.all()[0]
-            secondary_table_slug = secondary_table.table.slug
-            secondary_table_join_field = secondary_table.join_field.name
-            is_two_tables_filter = True
-
-        # Get all fields and display fields
-        all_fields = []
-        field_types = {}
-        for field in primary_table.fields.all().order_by("id"):
-            if obj.default_fields.all():
-                if field in obj.default_fields.all():
-                    field_key = "{}__{}".format(primary_table.table.slug, field.name)
-                    all_fields.append(field_key)
-                    field_types[field_key] = field.field_type
-            else:
-                field_key = "{}__{}".format(primary_table.table.slug, field.name)
-                all_fields.append(field_key)
-                field_types[field_key] = field.field_type
-
-        if is_two_tables_filter:
-            for field in secondary_table.fields.all().order_by("id"):
-                if obj.default_fields.all():
-                    if field in obj.default_fields.all():
-                        field_key = "{}__{}".format(secondary_table.table.slug, field.name)
-                        all_fields.append(field_key)
-                        field_types[field_key] = field.field_type
-                else:
-                    field_key = "{}__{}".format(secondary_table.table.slug, field.name)
-                    all_fields.append(field_key)
-                    field_types[field_key] = field.field_type
-
-        fields = all_fields
-        if str_fields:
-            if str_fields == "ALL":
-                fields = all_fields
-            else:
-                fields = str_fields.split(",") if str_fields else None
-
-        primary_table_fields = []
-        secondary_table_fields = []
-
-        for field in fields:
-            if field.startswith(primary_table_slug):
-                primary_table_fields.append(field.replace(primary_table_slug + "__", "data__"))
-            else:
-                secondary_table_fields.append(field.replace(secondary_table_slug + "__", "data__"))
-
-        if is_two_tables_filter:
-            secondary_table_fields.append("data__{}".format(secondary_table_join_field))
-
-        # order_table = str_order.replace("-", "").split("__")[0]
-        order_table = str_order.split("__")[0]
-        str_order = str_order.replace(order_table + "__", "")
-
-        if str_order:
-            if order_table.startswith("-"):
-                order_table = order_table[1:]
-                order_by = "-data__{}".format(str_order)
-            else:
-                order_by = "data__{}".format(str_order)
-        else:
-            order_by = "id"
+        obj = filters_with_tables().get(pk=pk)
+        filter_query = utils.resolve_filter(obj, request.GET)
+        queryset = utils.filter_entries_values(filter_query)
 
-        table_order_by = "id"
+        context = {"fields": filter_query.fields, "table_slug": filter_query.primary_table.table.slug}
+        # With a secondary table the listed entries are the secondary ones, joined to their primary entry
+        if filter_query.secondary_table:
+            context["table_slug"] = filter_query.secondary_table.table.slug
+            context["primary_table_slug"] = filter_query.primary_table.table.slug
 
-        # Create filters dict
-        filter_dict = {
-            primary_table_slug: Q(),
-        }
-        if is_two_tables_filter:
-            filter_dict[secondary_table_slug] = Q()
-
-        filter_dict = utils.request_get_to_filter(request.GET, field_types, filter_dict, True)
-
-        # If filter has only primary_table
-        if not is_two_tables_filter:
-            if order_table == primary_table_slug:
-                table_order_by = order_by
-            result_values = (
-                models.Entry.objects.filter(table__slug=primary_table_slug)
-                .filter(filter_dict[primary_table_slug])
-                .values(*primary_table_fields)
-                .order_by(table_order_by)
-            )
-            queryset = result_values
-            if not fields:
-                fields = [x.replace("data__", "{}__".format(primary_table_slug)) for x in primary_table_fields]
-            page = self.paginate_queryset(queryset)
-            if page is not None:
-                final_page = []
-                for entry in page:
-                    final_entry = {}
-                    for key in entry:
-                        final_entry[key.replace("data__", "{}__".format(primary_table_slug))] = entry[key]
-                    final_page.append(final_entry)
-
-                serializer = serializers.filters.FilterEntrySerializer(final_page, many=True, context={"fields": fields})
-                return self.get_paginated_response(serializer.data)
-        # If filter has secondary table
-        else:
-            if order_table == secondary_table_slug:
-                table_order_by = order_by
-
-            join_values = (
-                models.Entry.objects.filter(table=primary_table.table)
-                .filter(filter_dict[primary_table_slug])
-                .values("data__{}".format(primary_table.join_field.name))
-                .order_by(table_order_by)
-            )
-
-            # filter_dict[secondary_table_slug]["data__{}__in".format(secondary_table_join_field)] = join_values
-            filter_dict[secondary_table_slug] = filter_dict[secondary_table_slug] & Q(
-                **{"data__{}__in".format(secondary_table_join_field) :join_values})
-            table_order_by = "id"
-            if order_table == secondary_table_slug:
-                table_order_by = order_by
-
-            result_values = (
-                models.Entry.objects.filter(table__slug=secondary_table_slug)
-                .filter(filter_dict[secondary_table_slug])
-                .values(*secondary_table_fields)
-                .order_by(table_order_by)
-            )
-
-            queryset = result_values
-
-            if not fields:
-                fields = [x.replace("data__", "{}__".format(primary_table_slug)) for x in primary_table_fields]
-                fields += [x.replace("data__", "{}__".format(secondary_table_slug)) for x in secondary_table_fields]
-
-            page = self.paginate_queryset(queryset)
-
-            if page is not None:
-                final_page = []
-                page_join_values = [x["data__{}".format(secondary_table_join_field)] for x in page]
-
-                filter_dict[primary_table_slug] = filter_dict[primary_table_slug] & Q(
-                    **{"data__{}__in".format(primary_table_join_field): page_join_values})
-                # filter_dict[primary_table_slug]["data__{}__in".format(primary_table_join_field)] = page_join_values
-                primary_table_values = {
-                    x.data[primary_table_join_field]: {"data__" + key: value for key, value in x.data.items()}
-                    for x in models.Entry.objects.filter(table=primary_table.table)
-                    .filter(filter_dict[primary_table_slug])
-                    .exclude(data=None)
-                }
-
-                for entry in page:
-                    final_entry = {}
-                    final_entry_primary_table_values = {}
-
-                    entry_primary_table_values = primary_table_values[entry["data__{}".format(secondary_table_join_field)]]
-                    for key in entry:
-                        final_entry[key.replace("data__", "{}__".format(secondary_table_slug))] = entry.get(key, None)
-                    final_primary_table_fields = [x.replace('{}__'.format(primary_table_slug), '') for x in fields if not x.startswith('{}_'.format(secondary_table_slug))]
-                    # for key in entry_primary_table_values:
-
-                    for key in final_primary_table_fields:
-                        final_entry_primary_table_values[
-                            "{}__{}".format(primary_table_slug, key)
-                        ] = entry_primary_table_values.get('data__' + key, None)
-
-                    final_entry.update(final_entry_primary_table_values)
-                    final_page.append(final_entry)
-                serializer = serializers.filters.FilterEntrySerializer(final_page, many=True, context={"fields": fields})
-                return self.get_paginated_response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = serializers.filters.FilterEntrySerializer(page, many=True, context=context)
+            return self.get_paginated_response(serializer.data)
 
+        serializer = serializers.filters.FilterEntrySerializer(queryset, many=True, context=context)
         return Response(serializer.data)
 
     @action(
@@ -766,209 +650,57 @@ class FilterViewSet(viewsets.ModelViewSet):
         url_path="csv-export",
         url_name="csv-export")
     def csv_export(self, request, pk):
-        obj = models.Filter.objects.filter(pk=pk).prefetch_related("primary_table", "join_tables")[0]
-        str_fields = request.GET.get("__fields", "") if request else None
-        str_order = request.GET.get("__order", "") if request else None
-
-        primary_table = obj.primary_table
-        primary_table_slug = primary_table.table.slug
-
-        is_two_tables_filter = False
-
-        if obj.join_tables.all():
-            primary_table_join_field = primary_table.join_field.name
-            secondary_table = obj.join_tables.all()[0]
-            secondary_table_slug = secondary_table.table.slug
-            secondary_table_join_field = secondary_table.join_field.name
-            is_two_tables_filter = True
-
-        # Get all fields and display fields
-        all_fields = []
-        field_types = {}
-        for field in primary_table.fields.all().order_by("id"):
-            if obj.default_fields.all():
-                if field in obj.default_fields.all():
-                    field_key = "{}__{}".format(primary_table.table.slug, field.name)
-                    all_fields.append(field_key)
-                    field_types[field_key] = field.field_type
-            else:
-                field_key = "{}__{}".format(primary_table.table.slug, field.name)
-                all_fields.append(field_key)
-                field_types[field_key] = field.field_type
-
-        if is_two_tables_filter:
-            for field in secondary_table.fields.all().order_by("id"):
-                if obj.default_fields.all():
-                    if field in obj.default_fields.all():
-                        field_key = "{}__{}".format(secondary_table.table.slug, field.name)
-                        all_fields.append(field_key)
-                        field_types[field_key] = field.field_type
-                else:
-                    field_key = "{}__{}".format(secondary_table.table.slug, field.name)
-                    all_fields.append(field_key)
-                    field_types[field_key] = field.field_type
-
-        fields = all_fields
-        if str_fields:
-            if str_fields == "ALL":
-                fields = all_fields
-            else:
-                fields = str_fields.split(",") if str_fields else None
-
-        primary_table_fields = []
-        secondary_table_fields = []
-
-        for field in fields:
-            if field.startswith(primary_table_slug):
-                primary_table_fields.append(field.replace(primary_table_slug + "__", "data__"))
-            else:
-                secondary_table_fields.append(field.replace(secondary_table_slug + "__", "data__"))
-
-        if is_two_tables_filter:
-            secondary_table_fields.append("data__{}".format(secondary_table_join_field))
-
-        # order_table = str_order.replace("-", "").split("__")[0]
-        order_table = str_order.split("__")[0]
-        str_order = str_order.replace(order_table + "__", "")
-
-        if str_order:
-            if str_order.startswith("-"):
-                order_by = "-data__{}".format(str_order[1:])
-            else:
-                order_by = "data__{}".format(str_order)
-        else:
-            order_by = "id"
-
-        table_order_by = "id"
-
-        if order_table == primary_table_slug:
-            table_order_by = order_by
-
-        # Create filters dict
-        filter_dict = {
-            primary_table_slug: Q(),
-        }
-        if is_two_tables_filter:
-            filter_dict[secondary_table_slug] = Q()
-
-        filter_dict = utils.request_get_to_filter(request.GET, field_types, filter_dict, True)
-
-        # If filter has only primary_table
-        if not is_two_tables_filter:
-            result_values = (
-                models.Entry.objects.filter(table__slug=primary_table_slug)
-                .filter(filter_dict[primary_table_slug])
-                .values(*primary_table_fields)
-                .order_by(table_order_by)
-            )
-            queryset = result_values
-
-            if not fields:
-                fields = [x.replace("data__", "{}__".format(primary_table_slug)) for x in primary_table_fields]
-
-            paginator = Paginator(queryset, 1000)  # Show 100 objects per page, you can choose any other value
-
-            file_name = "{}__{}.csv".format(obj.slug, datetime.now().strftime("%d_%m_%Y__%H_%M"))
-            with open("/tmp/{}".format(file_name), "w", encoding="utf-8-sig") as csv_export_file:
-                writer = csv.DictWriter(
-                    csv_export_file,
-                    delimiter=",",
-                    quoting=csv.QUOTE_MINIMAL,
-                    fieldnames=fields,
-                )
-                writer.writeheader()
-                for i in paginator.page_range:  # A 1-based range iterator of page numbers, e.g. yielding [1, 2, 3, 4].
-                    # print("Writing page:", i)
-                    data = paginator.get_page(i)
-                    page = data.object_list
-
-                    for entry in page:
-                        final_entry = {}
-                        final_entry_primary_table_values = {}
-
-                        for key in entry:
-                            final_entry[key.replace("data__", "{}__".format(primary_table_slug))] = entry[key]
-                        
-                        writer.writerow({k: v for k, v in final_entry.items() if k in fields})
-
-        else:
-            join_values = (
-                models.Entry.objects.filter(table=primary_table.table)
-                .filter(filter_dict[primary_table_slug])
-                .values("data__{}".format(primary_table.join_field.name))
-                .order_by(table_order_by)
-            )
+        obj = filters_with_tables().get(pk=pk)
+        filter_query = utils.resolve_filter(obj, request.GET)
+        queryset = utils.filter_entries_values(filter_query)
+        fields = filter_query.fields
 
-            filter_dict[secondary_table_slug] = filter_dict[secondary_table_slug] & Q(
-                **{"data__{}__in".format(secondary_table_join_field): join_values})
-            # filter_dict[secondary_table_slug]["data__{}__in".format(secondary_table_join_field)] = join_values
+        primary_table_slug = filter_query.primary_table.table.slug
+        table_slug = primary_table_slug
+        if filter_query.secondary_table:
+            table_slug = filter_query.secondary_table.table.slug
 
-            table_order_by = "id"
-            if order_table == secondary_table_slug:
-                table_order_by = order_by
-
-            result_values = (
-                models.Entry.objects.filter(table__slug=secondary_table_slug)
-                .filter(filter_dict[secondary_table_slug])
-                .values(*secondary_table_fields)
-                .order_by(table_order_by)
+        def csv_rows():
+            writer = csv.DictWriter(
+                utils.Echo(),
+                delimiter=",",
+                quoting=csv.QUOTE_MINIMAL,
+                fieldnames=fields,
             )
-
-            queryset = result_values
-            if not fields:
-                fields = [x.replace("data__", "{}__".format(primary_table_slug)) for x in primary_table_fields]
-                fields += [x.replace("data__", "{}__".format(secondary_table_slug)) for x in secondary_table_fields]
-            queryset_count = queryset.count()
-            paginator = Paginator(queryset, 1000)  # Show 100 objects per page, you can choose any other value
-
-            file_name = "{}__{}.csv".format(obj.slug, datetime.now().strftime("%d_%m_%Y__%H_%M"))
-            with open("/tmp/{}".format(file_name), "w", encoding="utf-8-sig") as csv_export_file:
-                writer = csv.DictWriter(
-                    csv_export_file,
-                    delimiter=",",
-                    quoting=csv.QUOTE_MINIMAL,
-                    fieldnames=fields,
-                )
-                writer.writeheader()
-                for i in paginator.page_range:  # A 1-based range iterator of page numbers, e.g. yielding [1, 2, 3, 4].
-                    # print("Writing page:", i)
-                    data = paginator.get_page(i)
-                    page = data.object_list
-
-                    page_join_values = [x["data__{}".format(secondary_table_join_field)] for x in page]
-                    filter_dict[primary_table_slug] = filter_dict[primary_table_slug] & Q(
-                        **{"data__{}__in".format(primary_table_join_field): page_join_values})
-                    # filter_dict[primary_table_slug]["data__{}__in".format(primary_table_join_field)] = page_join_values
-                    primary_table_values = {
-                        x.data[primary_table_join_field]: {"data__" + key: value for key, value in x.data.items()}
-                        for x in models.Entry.objects.filter(table=primary_table.table)
-                        .filter(filter_dict[primary_table_slug])
-                        .exclude(data=None)
-                    }
-
-                    for entry in page:
-                        final_entry = {}
-                        final_entry_primary_table_values = {}
-
-                        entry_primary_table_values = primary_table_values[
-                            entry["data__{}".format(secondary_table_join_field)]
-                        ]
-
-                        for key in entry:
-                            final_entry[key.replace("data__", "{}__".format(secondary_table_slug))] = entry[key]
-                        for key in entry_primary_table_values:
-                            final_entry_primary_table_values[
-                                key.replace("data__", "{}__".format(primary_table_slug))
-                            ] = entry_primary_table_values[key]
-
-                        final_entry.update(final_entry_primary_table_values)
-                        writer.writerow({k: v for k, v in final_entry.items() if k in fields})
-
-        with open("/tmp/{}".format(file_name), "rb") as csv_export_file:
-            # response = HttpResponse(FileWrapper(csv_export_file), content_type='application/vnd.ms-excel')
-            response = HttpResponse(csv_export_file.read(), content_type="application/vnd.ms-excel")
-            response["Content-Disposition"] = 'attachment; filename="{}"'.format(file_name)
-        os.remove("/tmp/{}".format(file_name))
+            yield writer.writeheader()
+
+            # (column, primary data key) pairs of the joined primary entry
+            primary_columns = []
+            if filter_query.secondary_table:
+                primary_prefix = "{}__".format(primary_table_slug)
+                primary_columns = [
+                    (column, column[len(primary_prefix):]) for column in fields if column.startswith(primary_prefix)
+                ]
+            # (values key, column) pairs of the listed entry, mapped once from the queried fields
+            listed_table_fields = filter_query.primary_table_fields
+            if filter_query.secondary_table:
+                listed_table_fields = filter_query.secondary_table_fields
+            table_prefix = "{}__".format(table_slug)
+            entry_columns = [
+                (key, table_prefix + key[len("data__"):]) for key in listed_table_fields
+                if table_prefix + key[len("data__"):] in fields
+            ]
+            for entry in queryset.iterator(chunk_size=1000):
+                primary_data = entry.pop("primary_data", None) or {}
+                row = {column: entry[key] for key, column in entry_columns}
+                for column, key in primary_columns:
+                    if key in primary_data:
+                        row[column] = primary_data[key]
+                yield writer.writerow(row)
+
+        def csv_export_rows():
+            # Byte order mark, so spreadsheet applications detect the UTF-8 encoding
+            yield "\ufeff"
+            yield from csv_rows()
+
+        file_name = "{}__{}.csv".format(obj.slug, datetime.now().strftime("%d_%m_%Y__%H_%M"))
+        response = StreamingHttpResponse(csv_export_rows(), content_type="application/vnd.ms-excel")
+        response["Content-Disposition"] = 'attachment; filename="{}"'.format(file_name)
         return response
 
 
@@ -981,12 +713,27 @@ class EntryViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return models.Entry.objects.filter(table=self.kwargs["table_pk"])
 
+    def get_table(self):
+        """
+        The table of the entries, with its fields, fetched once per request
+        """
+        if not hasattr(self, "_table"):
+            self._table = models.Table.objects.prefetch_related("fields", "default_fields").get(
+                pk=self.kwargs["table_pk"])
+        return self._table
+
+    def get_field_names(self):
+        """
+        The names of the table fields, sorted from the prefetched fields
+        """
+        return sorted(field.name for field in self.get_table().fields.all())
+
     def list(self, request, table_pk):
-        table = models.Table.objects.get(pk=table_pk)
+        table = self.get_table()
         str_fields = request.GET.get("__fields", "") if request else None
         str_order = request.GET.get("__order", "") if request else None
-        table_fields = {x.name: x.field_type for x in table.fields.all().order_by("id")}
-        default_fields = {x.name: x for x in table.default_fields.all().order_by("id")}
+        table_fields = {x.name: x.field_type for x in table.fields.all()}
+        default_fields = {x.name: x for x in table.default_fields.all()}
 
         if str_fields == "ALL":
             fields = [x for x in table_fields.keys()]
@@ -1003,16 +750,29 @@ class EntryViewSet(viewsets.ModelViewSet):
 
         if str_order and str_order.replace("-", "") in fields:
             if str_order.startswith("-"):
-                queryset = table.entries.filter(filter_dict).order_by("-data__{}".format(str_order[1:]))
+                queryset = table.entries.filter(filter_dict).order_by("-data__{}".format(str_order[1:]), "id")
             else:
-                queryset = table.entries.filter(filter_dict).order_by("data__{}".format(str_order))
+                queryset = table.entries.filter(filter_dict).order_by("data__{}".format(str_order), "id")
         else:
             queryset = table.entries.filter(filter_dict).order_by("id")
             # queryset = table.entries.annotate(date_field=Cast(KeyTextTransform('data_iesire', "data"), DateField())).filter(date_field__exact='2020-07-21').order_by("id")
 
+        # When only some of the fields are displayed, the database sends only their keys of the entry data
+        displayed_data = len(set(fields)) < len(table_fields)
+        if displayed_data:
+            # An extra select rather than an annotation, so the paginator count doesn't compute it for every entry
+            displayed_data_sql = "SELECT jsonb_object_agg(key, value) FROM jsonb_each({}.data) WHERE key = ANY(%s)".format(
+                connection.ops.quote_name(models.Entry._meta.db_table))
+            queryset = queryset.defer("data").extra(
+                select={"displayed_data": displayed_data_sql}, select_params=(list(fields),))
+
         page = self.paginate_queryset(queryset)
 
         if page is not None:
+            if displayed_data:
+                for entry in page:
+                    # Django leaves the decoding of jsonb columns to the model fields, raw selects hold JSON strings
+                    entry.data = json.loads(entry.displayed_data) if entry.displayed_data else None
             serializer = serializers.entries.EntrySerializer(
                 page,
                 many=True,
@@ -1023,10 +783,10 @@ class EntryViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def retrieve(self, request, table_pk, pk):
-        table = models.Table.objects.get(pk=table_pk)
+        table = self.get_table()
         object = models.Entry.objects.get(pk=pk)
 
-        fields = table.fields.values_list("name", flat=True).order_by("name")
+        fields = self.get_field_names()
         serializer = serializers.entries.EntrySerializer(
             object,
             context={"fields": fields, "table": table, "request": request},
@@ -1035,10 +795,10 @@ class EntryViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def update(self, request, table_pk, pk, *args, **kwargs):
-        table = models.Table.objects.get(pk=table_pk)
+        table = self.get_table()
         object = self.get_object()
 
-        fields = table.fields.values_list("name", flat=True).order_by("name")
+        fields = self.get_field_names()
 
         serializer = serializers.entries.EntrySerializer(
             object,
@@ -1053,9 +813,9 @@ class EntryViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def create(self, request, table_pk):
-        table = models.Table.objects.get(pk=table_pk)
+        table = self.get_table()
         data = request.data
-        fields = table.fields.values_list("name", flat=True).order_by("name")
+        fields = self.get_field_names()
 
         serializer = serializers.entries.EntrySerializer(
             data=data,
@@ -1066,6 +826,14 @@ class EntryViewSet(viewsets.ModelViewSet):
             self.perform_create(serializer)
         except Exception as e:
             return Response({"detail": e.detail[0]}, status=status.HTTP_409_CONFLICT)
+        # Clients pushing many rows can skip the serialization of the created entry
+        preferences = [x.strip() for x in request.headers.get("Prefer", "").split(",")]
+        if "return=minimal" in preferences:
+            return Response(
+                {"id": serializer.instance.pk},
+                status=status.HTTP_201_CREATED,
+                headers={"Preference-Applied": "return=minimal"},
+            )
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
@@ -1094,23 +862,28 @@ class CsvImportViewSet(viewsets.ModelViewSet):
     def export_errors(self, request, pk):
         csv_import = self.get_object()
 
+        # Checked before the response starts streaming, which could not turn into an error response anymore
+        if not csv_import.errors:
+            return Response({"detail": "The import has no errors"}, status=status.HTTP_404_NOT_FOUND)
+        fieldnames = csv_import.errors[0]["row"].keys()
+
         file_name = "errors__" + csv_import.file.name.split("/")[-1]
-        with open("/tmp/{}".format(file_name), "w", encoding="utf-8-sig") as csv_export_file:
+
+        def csv_rows():
+            # Byte order mark, so spreadsheet applications detect the UTF-8 encoding
+            yield "\ufeff"
             writer = csv.DictWriter(
-                csv_export_file,
+                utils.Echo(),
                 delimiter=",",
                 quoting=csv.QUOTE_MINIMAL,
-                fieldnames=csv_import.errors[0]["row"].keys(),
+                fieldnames=fieldnames,
             )
-            writer.writeheader()
+            yield writer.writeheader()
             for row in csv_import.errors:
-                writer.writerow(row["row"])
+                yield writer.writerow(row["row"])
 
-        with open("/tmp/{}".format(file_name), "rb") as csv_export_file:
-            # response = HttpResponse(FileWrapper(csv_export_file), content_type='application/vnd.ms-excel')
-            response = HttpResponse(csv_export_file.read(), content_type="application/vnd.ms-excel")
-            response["Content-Disposition"] = 'attachment; filename="{}"'.format(file_name)
-        os.remove("/tmp/{}".format(file_name))
+        response = StreamingHttpResponse(csv_rows(), content_type="application/vnd.ms-excel")
+        response["Content-Disposition"] = 'attachment; filename="{}"'.format(file_name)
         return response
 
     def create(self, request):
@@ -1121,56 +894,44 @@ class CsvImportViewSet(viewsets.ModelViewSet):
             table = models.Table.objects.get(pk=table_id)
         fields = []
 
-        try:
-            file_content = file.read().decode("utf-8")
-        except:
-            try:
-                file.seek(0)
-                file_content = file.read().decode("windows-1252")
-            except:
-                response = {
-                    "success": False,
-                    "error_msg": 'Could not decode file',
-                }
-                return Response(response, status=status.HTTP_400_BAD_REQUEST)
-        decoded_file = file_content.splitlines()
-
         if delimiter == 'null':
             delimiter = None
-        if not delimiter:
-            file.seek(0)
-            dialect = csv.Sniffer().sniff(file_content[:2000])
-            reader = csv.DictReader(decoded_file, delimiter=dialect.delimiter)
-        else:
-            reader = csv.DictReader(decoded_file, delimiter=delimiter)
+        try:
+            fieldnames = utils.csv_fieldnames(file, delimiter)
+        except UnicodeDecodeError:
+            response = {
+                "success": False,
+                "error_msg": 'Could not decode file',
+            }
+            return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
         csv_import = models.CsvImport.objects.create(file=file, delimiter=delimiter)
 
-        for field in reader.fieldnames:
-            csv_field_map = models.CsvFieldMap.objects.create(
+        # The first mapping of each original name the table already has
+        table_field_maps = {}
+        if table_id:
+            for field_map in table.csv_field_mapping.select_related("table_column").order_by("id"):
+                table_field_maps.setdefault(field_map.original_name, field_map)
+
+        csv_field_maps = []
+        for field in fieldnames:
+            csv_field_map = models.CsvFieldMap(
                 csv_import=csv_import, original_name=field, display_name=field
             )
             existing_table_field = None
             existing_table_format = None
 
-            if table_id:
-                if table.csv_field_mapping.all():
-                    field_maps = table.csv_field_mapping.filter(
-                        original_name=field)
-                    if field_maps:
-                        try:
-                            existing_table_field = field_maps[0].table_column.pk
-                            csv_field_map.table_column = field_maps[0].table_column
-                            csv_field_map.field_format = field_maps[0].field_format
-                            csv_field_map.field_type = field_maps[0].field_type
-                            csv_field_map.required = field_maps[0].required
-                            csv_field_map.unique = field_maps[0].unique
-                            csv_field_map.save()
-                        except:
-                            # existing_table_field = models.TableColumn.objects.get(
-                            # table=table, name=utils.snake_case(field_maps[0].field_name)).pk
-                            pass
-                        existing_table_format = field_maps[0].field_format
+            field_map = table_field_maps.get(field)
+            if field_map:
+                if field_map.table_column:
+                    existing_table_field = field_map.table_column.pk
+                    csv_field_map.table_column = field_map.table_column
+                    csv_field_map.field_format = field_map.field_format
+                    csv_field_map.field_type = field_map.field_type
+                    csv_field_map.required = field_map.required
+                    csv_field_map.unique = field_map.unique
+                existing_table_format = field_map.field_format
+            csv_field_maps.append(csv_field_map)
             fields.append(
                 {
                     "original_name": field.encode(),
@@ -1182,6 +943,7 @@ class CsvImportViewSet(viewsets.ModelViewSet):
                     "unique": csv_field_map.unique,
                 }
             )
+        models.CsvFieldMap.objects.bulk_create(csv_field_maps, batch_size=500)
 
         response = {
             "success": True,
@@ -1207,12 +969,9 @@ class ChartViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = self.queryset
         user = self.request.user
-        user_view_tables = []
-
-        for table in get_objects_for_user(user, 'api.view_table'):
-            if user.has_perm('view_table', table) or 'admin' in user.groups.values_list('name', flat=True):
-                user_view_tables.append(table)
-        return queryset.filter(table__in=user_view_tables)
+        # The admins also see the tables of their global view permission
+        view_tables = user_view_tables(user, accept_global_perms=models.is_admin(user))
+        return queryset.filter(table__in=view_tables).select_related("table", "owner", "last_edit_user")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -1260,13 +1019,14 @@ class ChartViewSet(viewsets.ModelViewSet):
     def get_preview(self, request):
         chart = models.Chart()
         table = models.Table.objects.get(pk=request.GET.get('table', None))
-        timeline_field = models.TableColumn.objects.get(pk=int(request.GET.get('timeline_field', None))) if request.GET.get('timeline_field', None) else None
-        x_axis_field = models.TableColumn.objects.get(pk=int(request.GET.get('x_axis_field', None))) if request.GET.get('x_axis_field', None) else None
-        y_axis_field = models.TableColumn.objects.get(pk=int(request.GET.get('y_axis_field', None))) if request.GET.get('y_axis_field', None) else None
+        # The three chart columns are fetched in one query
+        column_params = ['timeline_field', 'x_axis_field', 'y_axis_field']
+        column_ids = {param: int(request.GET[param]) for param in column_params if request.GET.get(param, None)}
+        columns = models.TableColumn.objects.in_bulk(column_ids.values())
         chart.table = table
-        chart.timeline_field = timeline_field
-        chart.x_axis_field = x_axis_field
-        chart.y_axis_field = y_axis_field
+        chart.timeline_field = columns.get(column_ids.get('timeline_field'))
+        chart.x_axis_field = columns.get(column_ids.get('x_axis_field'))
+        chart.y_axis_field = columns.get(column_ids.get('y_axis_field'))
 
         chart.chart_type = request.GET.get('chart_type', None)
         chart.timeline_period = request.GET.get('timeline_period', None)
@@ -1292,12 +1052,9 @@ class CardViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = self.queryset
         user = self.request.user
-        user_view_tables = []
-
-        for table in get_objects_for_user(user, 'api.view_table'):
-            if user.has_perm('view_table', table) or 'admin' in user.groups.values_list('name', flat=True):
-                user_view_tables.append(table)
-        return queryset.filter(table__in=user_view_tables)
+        # The admins also see the tables of their global view permission
+        view_tables = user_view_tables(user, accept_global_perms=models.is_admin(user))
+        return queryset.filter(table__in=view_tables).select_related("table", "owner", "last_edit_user")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -82,6 +82,9 @@ USE_AZURE = (
 PLUGIN_MAILCHIMP_ENABLED = env.bool("PLUGIN_MAILCHIMP_ENABLED", False)
 PLUGIN_WOOCOMMERCE_ENABLED = env.bool("PLUGIN_WOOCOMMERCE_ENABLED", False)
 
+# The silk request profiler wraps every request and SQL query, so it is only installed on demand
+ENABLE_SILK = env.bool("ENABLE_SILK", False)
+
 
 # Application definition
 
@@ -104,7 +107,6 @@ INSTALLED_APPS = [
     "corsheaders",
     "django_filters",
     "crispy_forms",
-    # "silk",
     "djoser",
     "django_celery_beat",
     "django_celery_results",
@@ -116,6 +118,9 @@ if PLUGIN_WOOCOMMERCE_ENABLED:
 if PLUGIN_MAILCHIMP_ENABLED:
     INSTALLED_APPS.append("plugin_mailchimp")
 
+if ENABLE_SILK:
+    INSTALLED_APPS.append("silk")
+
 if not (USE_S3 or USE_AZURE):
     INSTALLED_APPS.append("whitenoise.runserver_nostatic")
 
@@ -134,6 +139,9 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+if ENABLE_SILK:
+    MIDDLEWARE.append("silk.middleware.SilkyMiddleware")
+
 ROOT_URLCONF = "paul_api.urls"
 
 TEMPLATES = [
@@ -277,6 +285,7 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880
 
 SILKY_AUTHENTICATION = True  # User must login
 SILKY_AUTHORISATION = True  # User must have permissions
+SILKY_PYTHON_PROFILER = ENABLE_SILK
 
 DJOSER = {
     "USER_CREATE_PASSWORD_RETYPE": True,
@@ -38,12 +38,14 @@ if settings.PLUGIN_WOOCOMMERCE_ENABLED:
         )
     )
 
+if settings.ENABLE_SILK:
+    plugin_urlpatterns.append(path("api/silk/", include("silk.urls", namespace="silk")))
+
 
 urlpatterns = (
     i18n_patterns(
         path("api/api-token-auth/", include("rest_framework.urls")),
         path("api/admin/", admin.site.urls),
-        # path("api/silk/", include("silk.urls", namespace="silk")),
         *plugin_urlpatterns,
         path("api/", include("api.urls")),
     )
@@ -96,9 +96,9 @@ def run_segmentation(request, task_id):
     filtered_view = task.segmentation_task.filtered_view
     primary_table = filtered_view.primary_table
 
-    audience_members_table = api_models.Table.objects.filter(name=settings.audience_members_table_name)
+    audience_members_table = api_models.Table.objects.filter(name=settings.audience_members_table_name).first()
 
-    if not audience_members_table.exists():
+    if not audience_members_table:
         success = False
         stats['errors'] += 1
         stats['details'].append(
@@ -106,7 +106,6 @@ def run_segmentation(request, task_id):
                 settings.audience_members_table_name
             ))
     else:
-        audience_members_table = audience_members_table[0]
         if primary_table.table != audience_members_table:
             success = False
             stats['errors'] += 1
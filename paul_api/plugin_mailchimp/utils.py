@@ -121,11 +121,9 @@ def run_sync(key,
     segment_members_table_fields_defs = table_fields.TABLE_MAPPING['segment_members']
 
     for list in lists['lists']:
-        audience_exists = models.Entry.objects.filter(
-            table=audiences_table, data__id=list['id'])
-
-        if audience_exists:
-            audience_entry = audience_exists[0]
+        audience_entry = models.Entry.objects.filter(
+            table=audiences_table, data__id=list['id']).first()
+        if audience_entry:
             stats[audiences_table_name]['updated'] += 1
         else:
             stats[audiences_table_name]['created'] += 1
@@ -146,10 +144,9 @@ def run_sync(key,
         audience_entry.save()
 
         # Sync list stats
-        audience_stats_exists = models.Entry.objects.filter(
-            table=audiences_stats_table, data__audience_id=list['id'])
-        if audience_stats_exists:
-            audience_stats_entry = audience_stats_exists[0]
+        audience_stats_entry = models.Entry.objects.filter(
+            table=audiences_stats_table, data__audience_id=list['id']).first()
+        if audience_stats_entry:
             stats[audiences_stats_table_name]['updated'] += 1
         else:
             stats[audiences_stats_table_name]['created'] += 1
@@ -176,10 +173,9 @@ def run_sync(key,
 
         for segment in list_segments['segments']:
             # print('     Segment:', segment['name'])
-            audience_segments_exists = models.Entry.objects.filter(
-                table=audience_segments_table, data__audience_id=segment['list_id'])
-            if audience_segments_exists:
-                audience_segments_entry = audience_segments_exists[0]
+            audience_segments_entry = models.Entry.objects.filter(
+                table=audience_segments_table, data__audience_id=segment['list_id']).first()
+            if audience_segments_entry:
                 stats[audience_segments_table_name]['updated'] += 1
             else:
                 stats[audience_segments_table_name]['created'] += 1
@@ -206,10 +202,9 @@ def run_sync(key,
 
             for member in segment_members['members']:
                 # print('         Segment member:', member['email_address'])
-                segment_members_exists = models.Entry.objects.filter(
-                    table=segment_members_table, data__id=member['id'], data__segment_id=segment['id'])
-                if segment_members_exists:
-                    segment_members_entry = segment_members_exists[0]
+                segment_members_entry = models.Entry.objects.filter(
+                    table=segment_members_table, data__id=member['id'], data__segment_id=segment['id']).first()
+                if segment_members_entry:
                     stats[segment_members_table_name]['updated'] += 1
                 else:
                     stats[segment_members_table_name]['created'] += 1
@@ -259,10 +254,9 @@ def run_sync(key,
         for member in list_members['members']:
             # print('     List member:', member['email_address'])
             member['audience_name'] = list['name']
-            audience_members_exists = models.Entry.objects.filter(
-                table=audience_members_table, data__id=member['id'], data__audience_id=list['id'])
-            if audience_members_exists:
-                audience_members_entry = audience_members_exists[0]
+            audience_members_entry = models.Entry.objects.filter(
+                table=audience_members_table, data__id=member['id'], data__audience_id=list['id']).first()
+            if audience_members_entry:
                 stats[audience_members_table_name]['updated'] += 1
             else:
                 stats[audience_members_table_name]['created'] += 1
@@ -1211,7 +1211,7 @@ def run_sync(
                         table_fields_def[unique_field]["display_name"]
                     ],
                 }
-                entry = models.Entry.objects.filter(**entry_filter)
+                entry = models.Entry.objects.filter(**entry_filter).first()
                 print(table, i)
 
                 if not entry:
@@ -1223,8 +1223,6 @@ def run_sync(
                             ]
                         },
                     )
-                else:
-                    entry = entry[0]
 
                 entry_data = {}
                 for entry_field_name in table_fields_def: